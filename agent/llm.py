@@ -0,0 +1,26 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# dependencies = [
+#   "python-dotenv",
+#   "langchain-openai",
+# ]
+# ///
+
+import functools
+
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+
+@functools.lru_cache(maxsize=1)
+def get_llm():
+    """Build the shared GPT-4o client on first use.
+
+    Every module importing its own ChatOpenAI pays for a separate HTTP pool
+    and a separate lazily-loaded tiktoken encoder (~5 MB each); one cached
+    instance also lets the global langchain LLM cache actually hit across
+    callers.
+    """
+    return ChatOpenAI(model="gpt-4o", temperature=0.3)
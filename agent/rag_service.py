@@ -0,0 +1,66 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# dependencies = [
+#   "requests",
+#   "python-dotenv",
+# ]
+# ///
+
+import os
+import io
+import json
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+# ensure VIARAG_API_KEY is set in your .env file
+VIARAG_API_URL = os.environ.get("VIARAG_API_URL", "https://api.viarag.ai/v1")
+VIARAG_API_KEY = os.environ.get("VIARAG_API_KEY")
+
+MAX_FILES_PER_UPLOAD = 64  # ViaRAG caps files per multipart request; split anything bigger
+
+
+def upload_gif_summaries(summaries, metadata=None):
+    """Upload a batch of summaries/hypotheticals in one multipart request.
+
+    Builds the whole multipart/form-data body in memory, so a GIF's summary
+    plus its k hypotheticals cost one HTTP round-trip instead of k+1 (and no
+    tempfiles). Splits automatically when the batch exceeds the per-request
+    cap. Returns a list with one response object per request issued.
+    """
+    if len(summaries) > MAX_FILES_PER_UPLOAD:
+        results = []
+        for i in range(0, len(summaries), MAX_FILES_PER_UPLOAD):
+            results.extend(upload_gif_summaries(summaries[i : i + MAX_FILES_PER_UPLOAD], metadata))
+        return results
+
+    files = [
+        ("files", (f"summary_{i}.txt", io.BytesIO(text.encode("utf-8")), "text/plain"))
+        for i, text in enumerate(summaries)
+    ]
+    response = requests.post(
+        f"{VIARAG_API_URL}/upload_batch",
+        headers={"Authorization": f"Bearer {VIARAG_API_KEY}"},
+        files=files,
+        data={"metadata": json.dumps(metadata or {})},
+    )
+    response.raise_for_status()
+    return [response.json()]
+
+
+def upload_single_gif_summary(summary, metadata=None):
+    """Upload one GIF summary (or hypothetical question) as a ViaRAG document.
+
+    Summaries are a few hundred bytes, so the multipart part is built from an
+    in-memory BytesIO; no tempfile, no unlink, no disk round-trip.
+    """
+    buffer = io.BytesIO(summary.encode("utf-8"))
+    response = requests.post(
+        f"{VIARAG_API_URL}/upload",
+        headers={"Authorization": f"Bearer {VIARAG_API_KEY}"},
+        files={"file": ("summary.txt", buffer, "text/plain")},
+        data={"metadata": json.dumps(metadata or {})},
+    )
+    response.raise_for_status()
+    return response.json()
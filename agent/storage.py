@@ -0,0 +1,582 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# dependencies = [
+#   "pillow",
+#   "imagehash",
+#   "imageio",
+#   "av",
+#   "numpy",
+#   "requests",
+#   "supabase",
+#   "python-dotenv",
+#   "langchain",
+#   "langchain-community",
+#   "langchain-openai",
+#   "langchain-core",
+# ]
+# ///
+
+import os
+import io
+import sys
+import json
+import base64
+import secrets
+import shutil
+import asyncio
+import hashlib
+import logging
+import functools
+import subprocess
+import importlib.util
+from pathlib import Path
+from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+import imagehash
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image, ImageSequence
+from dotenv import load_dotenv
+from supabase import create_client, acreate_client
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from langchain_core.messages import SystemMessage, HumanMessage
+
+import rag_service
+from llm import get_llm
+
+load_dotenv()
+# ensure SUPABASE_URL, SUPABASE_KEY, and OPENAI_API_KEY are set in your .env file
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+GIF_BUCKET = os.environ.get("GIF_BUCKET", "gifs")
+
+MAX_MB = 50  # Supabase storage caps uploads; compress anything bigger
+NUM_HYPOTHETICALS = 3
+MAX_CONCURRENT_GIFS = 8  # bound folder ingestion so we don't trip API rate limits
+
+logger = logging.getLogger(__name__)
+
+llm = get_llm()
+supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# dedupe identical prompts (e.g. re-ingesting the same summary) across runs
+set_llm_cache(SQLiteCache(".langchain.db"))
+
+# one pooled session for all storage uploads: keeps TLS connections alive
+# across GIFs instead of re-handshaking per request, and retries flaky 5xxs
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            # urllib3 won't retry POST by default; these uploads are
+            # idempotent (x-upsert overwrites the same file_id), so opt in
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+        ),
+    ),
+)
+
+
+TRANSPARENT_INDEX = 255  # palette slot reserved for unchanged-pixel deltas
+GIF_FPS = 10  # fallback frame rate when a GIF carries no duration metadata
+
+# FFmpeg (via PyAV) keeps the whole decode/quantize/encode pipeline in native
+# code; fall back to the Pillow path when libav isn't available
+HAS_PYAV = importlib.util.find_spec("av") is not None
+if HAS_PYAV:
+    import imageio.v3 as iio
+
+
+def _ffmpeg_palette_compress(gif_bytes, max_width):
+    """Re-encode a GIF through FFmpeg's palettegen/paletteuse filter graph."""
+    frames = iio.imread(gif_bytes, extension=".gif", index=None)
+
+    # keep the source timing: subscriber captures are written at TARGET_FPS,
+    # and the Pillow fallback preserves per-frame durations, so a hardcoded
+    # fps here would change playback speed depending on which path ran
+    duration_ms = Image.open(io.BytesIO(gif_bytes)).info.get("duration", 0)
+    fps = round(1000 / duration_ms) if duration_ms else GIF_FPS
+
+    graph = (
+        {
+            "scale": ("scale", f"{max_width}:-1:flags=lanczos"),
+            "split": "split",
+            "palettegen": "palettegen",
+            "paletteuse": ("paletteuse", "dither=bayer"),
+        },
+        [
+            ("video_in", "scale", 0, 0),
+            ("scale", "split", 0, 0),
+            ("split", "palettegen", 0, 0),
+            ("split", "paletteuse", 1, 0),
+            ("palettegen", "paletteuse", 0, 1),
+            ("paletteuse", "video_out", 0, 0),
+        ],
+    )
+    return iio.imwrite(
+        "<bytes>",
+        frames,
+        extension=".gif",
+        plugin="pyav",
+        codec="gif",
+        fps=fps,
+        filter_graph=graph,
+    )
+
+
+def _gifsicle_pass(gif_bytes):
+    """Squeeze an encoded GIF through gifsicle's lossy optimizer, if installed.
+
+    gifsicle -O3 with lossy LZW beats Pillow's optimize=True by a wide margin;
+    since this only runs on GIFs that already exceeded MAX_MB, the quality
+    trade-off is acceptable. Falls back to the input when gifsicle is absent
+    or errors out.
+    """
+    if shutil.which("gifsicle") is None:
+        return gif_bytes
+    try:
+        result = subprocess.run(
+            ["gifsicle", "-O3", "--lossy=80", "--colors=128", "-"],
+            input=gif_bytes,
+            capture_output=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as exc:
+        logger.warning(
+            "gifsicle failed, keeping Pillow output: %s",
+            exc.stderr.decode(errors="replace").strip(),
+        )
+        return gif_bytes
+    return result.stdout if 0 < len(result.stdout) < len(gif_bytes) else gif_bytes
+
+
+# CPU-bound compression runs in worker processes so the GIL never stalls the
+# async ingest loop; created lazily since most GIFs never exceed MAX_MB
+_compress_pool = None
+
+
+def _get_compress_pool():
+    global _compress_pool
+    if _compress_pool is None:
+        _compress_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _compress_pool
+
+
+def compress_gif_bytes(gif_bytes, max_width=400):
+    """Downscale and re-encode a GIF that blew past the MAX_MB upload limit."""
+    if HAS_PYAV:
+        try:
+            return _ffmpeg_palette_compress(gif_bytes, max_width)
+        except Exception as exc:
+            logger.warning("FFmpeg palette compression failed, using Pillow: %s", exc)
+
+    gif = Image.open(io.BytesIO(gif_bytes))
+    rgb_frames = []
+    for frame in ImageSequence.Iterator(gif):
+        # resize in RGB: palette-mode resize degrades to NEAREST, and the RGB
+        # LANCZOS path is the one Pillow-SIMD accelerates (drop-in replacement
+        # for pillow when AVX2 is available)
+        rgb = frame.convert("RGB")
+        w_percent = max_width / float(rgb.size[0])
+        h_size = int(float(rgb.size[1]) * w_percent)
+        rgb_frames.append(rgb.resize((max_width, h_size), Image.LANCZOS))
+
+    # build one master palette for the whole clip: quantizing frames
+    # independently emits a local color table per frame, which bloats the file
+    width, height = rgb_frames[0].size
+    stacked = Image.new("RGB", (width, height * len(rgb_frames)))
+    for i, rgb in enumerate(rgb_frames):
+        stacked.paste(rgb, (0, i * height))
+    master = stacked.convert(
+        "P", dither=Image.FLOYDSTEINBERG, palette=Image.ADAPTIVE, colors=TRANSPARENT_INDEX
+    )
+
+    frames = [rgb.quantize(palette=master, dither=Image.Dither.NONE) for rgb in rgb_frames]
+
+    # transparent-delta: map pixels unchanged since the previous frame to the
+    # reserved transparent index so LZW sees long single-symbol runs
+    palette = master.getpalette()
+    prev = np.asarray(rgb_frames[0])
+    delta_frames = []
+    for i in range(1, len(frames)):
+        current = np.asarray(rgb_frames[i])
+        unchanged = (current == prev).all(axis=-1)
+        indexed = np.array(frames[i])
+        indexed[unchanged] = TRANSPARENT_INDEX
+        delta = Image.fromarray(indexed, mode="P")
+        delta.putpalette(palette)
+        delta_frames.append(delta)
+        prev = current
+
+    output = io.BytesIO()
+    frames[0].save(
+        output,
+        format="GIF",
+        save_all=True,
+        append_images=delta_frames,
+        optimize=True,
+        loop=0,
+        transparency=TRANSPARENT_INDEX,
+        disposal=1,
+    )
+    return _gifsicle_pass(output.getvalue())
+
+
+PHASH_MAX_DISTANCE = 6  # Hamming distance below which two GIFs count as the same clip
+SUMMARY_CACHE_MAX = 256  # local fuzzy-match cache entries
+
+# phash -> summary, kept small and LRU-ish for Hamming-distance fuzzy lookups
+_phash_cache = OrderedDict()
+
+
+def _summary_cache_get(sha256, phash):
+    """Return a cached summary for an exact or near-duplicate GIF, else None."""
+    try:
+        rows = (
+            supabase.table("gif_summary_cache")
+            .select("summary")
+            .eq("sha256", sha256)
+            .limit(1)
+            .execute()
+        ).data
+        if not rows:
+            rows = (
+                supabase.table("gif_summary_cache")
+                .select("summary")
+                .eq("phash", str(phash))
+                .limit(1)
+                .execute()
+            ).data
+        if rows:
+            _phash_cache[phash] = rows[0]["summary"]
+            return rows[0]["summary"]
+    except Exception as exc:
+        logger.warning("Summary cache lookup failed: %s", exc)
+
+    # fuzzy match: near-duplicate clips land within a few bits of each other;
+    # scan a snapshot, since concurrent pipelines insert/evict from other
+    # worker threads and a dict mutated mid-iteration raises
+    for cached_phash, summary in list(_phash_cache.items()):
+        if phash - cached_phash <= PHASH_MAX_DISTANCE:
+            return summary
+    return None
+
+
+def _summary_cache_put(sha256, phash, summary):
+    _phash_cache[phash] = summary
+    while len(_phash_cache) > SUMMARY_CACHE_MAX:
+        _phash_cache.popitem(last=False)
+    try:
+        supabase.table("gif_summary_cache").upsert(
+            {
+                "phash": str(phash),
+                "sha256": sha256,
+                "summary": summary,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+            on_conflict="phash",
+            ignore_duplicates=True,
+        ).execute()
+    except Exception as exc:
+        logger.warning("Summary cache write failed: %s", exc)
+
+
+def summarize_gif(gif_bytes, public_url=None):
+    """Ask GPT-4o for a short description of the GIF.
+
+    Duplicate and near-duplicate GIFs (exact SHA-256 or perceptual-hash match
+    on the middle frame) skip the multi-second LLM call entirely. When the GIF
+    is already uploaded, pass its public_url so the request carries a URL
+    instead of a 4/3x-inflated base64 copy of the whole file.
+    """
+    sha256 = hashlib.sha256(gif_bytes).hexdigest()
+    gif = Image.open(io.BytesIO(gif_bytes))
+    gif.seek(getattr(gif, "n_frames", 1) // 2)
+    phash = imagehash.phash(gif.convert("RGB"))
+
+    cached = _summary_cache_get(sha256, phash)
+    if cached is not None:
+        logger.info("Summary cache hit (%s)", sha256[:12])
+        return cached
+
+    if public_url is None:
+        # fallback for GIFs that aren't in storage yet; stay in bytes and
+        # decode once at the end (ASCII fast path) instead of materializing a
+        # b64 str and then concatenating it into yet another str
+        buf = bytearray(b"data:image/gif;base64,")
+        buf += base64.b64encode(gif_bytes)
+        public_url = bytes(buf).decode("ascii")
+    message = HumanMessage(
+        content=[
+            {
+                "type": "text",
+                "text": "Describe what happens in this GIF in two or three sentences. "
+                "Focus on the actions and objects a sight-impaired user would want to know about.",
+            },
+            {"type": "image_url", "image_url": {"url": public_url}},
+        ]
+    )
+    response = llm.invoke([message])
+    _summary_cache_put(sha256, phash, response.content)
+    return response.content
+
+
+def upload_gif_to_supabase(gif_bytes, file_id):
+    """Upload the GIF to Supabase Storage and return its public URL."""
+    upload_url = f"{SUPABASE_URL}/storage/v1/object/{GIF_BUCKET}/{file_id}"
+    headers = {
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "image/gif",
+        "x-upsert": "true",
+    }
+    # pass the bytes directly: a file-like body would be left at EOF after a
+    # failed attempt and the retry would send a truncated/empty payload
+    response = SESSION.post(upload_url, headers=headers, data=gif_bytes)
+    response.raise_for_status()
+    return f"{SUPABASE_URL}/storage/v1/object/public/{GIF_BUCKET}/{file_id}"
+
+
+METADATA_BATCH_SIZE = 32
+METADATA_BATCH_WINDOW_S = 0.25
+
+
+# async client for writes issued from the pipeline's event loop; created
+# lazily because acreate_client needs a running loop
+_async_supabase = None
+
+
+async def _get_async_supabase():
+    global _async_supabase
+    if _async_supabase is None:
+        _async_supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+    return _async_supabase
+
+
+async def store_metadata_rows(rows):
+    """Insert a batch of metadata rows in one PostgREST round-trip."""
+    client = await _get_async_supabase()
+    await client.table("gif_metadata").insert(rows).execute()
+
+
+class _MetadataWriter:
+    """Single writer task that flushes metadata inserts in batches.
+
+    Concurrent pipelines each used to pay one PostgREST round-trip per GIF;
+    rows arriving within METADATA_BATCH_WINDOW_S (or up to
+    METADATA_BATCH_SIZE of them) now go up as one array insert.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+
+    async def put(self, row):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + METADATA_BATCH_WINDOW_S
+            while len(batch) < METADATA_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            created_at = datetime.now(timezone.utc).isoformat()  # once per flush
+            rows = [dict(row, created_at=created_at) for row, _ in batch]
+            try:
+                await store_metadata_rows(rows)
+                for _, future in batch:
+                    future.set_result(None)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+
+METADATA = _MetadataWriter()
+
+
+# system prompts are static per k: building them once keeps the prefix
+# byte-identical across calls so provider-side prompt caching can fire
+@functools.lru_cache(maxsize=4)
+def _hypo_system_message(k):
+    return SystemMessage(
+        content=f"You write hypothetical questions for a retrieval index. Given a short "
+        f"description of a video clip, write exactly {k} questions a user might ask "
+        f"that this clip would answer. Respond with a JSON object of the form "
+        f'{{"questions": [<{k} strings>]}}.'
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _hypo_batch_system_message(k):
+    return SystemMessage(
+        content=f"You write hypothetical questions for a retrieval index. You are given "
+        f"several short video-clip descriptions, each prefixed with a numeric id in "
+        f"square brackets. For each one, write exactly {k} questions a user might ask "
+        f'that the clip would answer. Respond with a JSON object of the form '
+        f'{{"results": [{{"id": <int>, "questions": [<{k} strings>]}}, ...]}} '
+        f"covering every id."
+    )
+
+
+def generate_hypotheticals(summary, k=NUM_HYPOTHETICALS):
+    """Generate k hypothetical user questions this GIF's summary could answer."""
+    response = llm.invoke(
+        [_hypo_system_message(k), HumanMessage(content=summary)],
+        response_format={"type": "json_object"},
+    )
+    questions = list(json.loads(response.content)["questions"])[:k]
+    if len(questions) != k:
+        raise ValueError(f"expected {k} hypotheticals, got {len(questions)}")
+    return questions
+
+
+HYPO_BATCH_SIZE = 8  # summaries per GPT-4o call when batching
+HYPO_BATCH_WINDOW_S = 0.25  # how long the batcher waits for more summaries
+
+
+async def generate_hypotheticals_batch(summaries, k=NUM_HYPOTHETICALS):
+    """Generate hypotheticals for many summaries at once.
+
+    One JSON-schema GPT-4o call covers a whole chunk of summaries, and chunks
+    run concurrently, so a folder of GIFs pays ~N/HYPO_BATCH_SIZE LLM
+    round-trips instead of N. Returns one list of k questions per summary,
+    in input order.
+    """
+    async def one_chunk(chunk, offset):
+        user = "\n\n".join(f"[{offset + i}] {summary}" for i, summary in enumerate(chunk))
+        response = await llm.ainvoke(
+            [_hypo_batch_system_message(k), HumanMessage(content=user)],
+            response_format={"type": "json_object"},
+        )
+        by_id = {int(r["id"]): list(r["questions"])[:k] for r in json.loads(response.content)["results"]}
+        return [by_id[offset + i] for i in range(len(chunk))]
+
+    offsets = range(0, len(summaries), HYPO_BATCH_SIZE)
+    chunk_results = await asyncio.gather(
+        *[one_chunk(summaries[o : o + HYPO_BATCH_SIZE], o) for o in offsets]
+    )
+    return [hypos for chunk in chunk_results for hypos in chunk]
+
+
+class _HypotheticalBatcher:
+    """Coalesces concurrent per-GIF hypothetical requests into batched calls.
+
+    Pipelines running under ingest_folder all hit the LLM around the same
+    time; requests arriving within HYPO_BATCH_WINDOW_S are merged into one
+    generate_hypotheticals_batch call.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+
+    async def get(self, summary):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((summary, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + HYPO_BATCH_WINDOW_S
+            while len(batch) < HYPO_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await generate_hypotheticals_batch([summary for summary, _ in batch])
+                for (_, future), hypos in zip(batch, results):
+                    future.set_result(hypos)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+
+HYPOTHETICALS = _HypotheticalBatcher()
+
+
+def add_to_vector_store(file_id, summary, hypos):
+    """Index the summary and its hypothetical questions in the RAG store."""
+    rag_service.upload_gif_summaries([summary, *hypos], metadata={"file_id": file_id})
+
+
+async def send_gif_to_supabase_pipeline(gif_bytes):
+    """Ingest one GIF: compress if oversized, then upload + summarize + index it.
+
+    The upload runs first so the GPT-4o vision call can reference the public
+    URL instead of shipping the whole GIF base64-inlined; within one GIF the
+    steps are serial, and concurrency comes from ingest_folder gathering many
+    pipelines at once.
+    """
+    if len(gif_bytes) > MAX_MB * 1024 * 1024:
+        gif_bytes = await asyncio.get_running_loop().run_in_executor(
+            _get_compress_pool(), compress_gif_bytes, gif_bytes
+        )
+
+    # same 128 bits of entropy as uuid4 without the UUID parsing/formatting
+    file_id = f"{secrets.token_hex(16)}.gif"
+
+    # upload first: GPT-4o can then fetch the public URL itself instead of us
+    # shipping the whole GIF base64-inlined through the chat payload
+    public_url = await asyncio.to_thread(upload_gif_to_supabase, gif_bytes, file_id)
+    summary = await asyncio.to_thread(summarize_gif, gif_bytes, public_url)
+
+    await METADATA.put({"file_id": file_id, "public_url": public_url, "summary": summary})
+    hypos = await HYPOTHETICALS.get(summary)
+    await asyncio.to_thread(add_to_vector_store, file_id, summary, hypos)
+
+    logger.info("Ingested %s (%d bytes)", file_id, len(gif_bytes))
+    return file_id, public_url, summary
+
+
+async def ingest_folder(folder_path):
+    """Ingest every GIF in a folder, up to MAX_CONCURRENT_GIFS at a time."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_GIFS)
+
+    async def bounded_pipeline(gif_path):
+        async with semaphore:
+            return await send_gif_to_supabase_pipeline(gif_path.read_bytes())
+
+    paths = sorted(folder_path.glob("*.gif"))
+    results = await asyncio.gather(*[bounded_pipeline(p) for p in paths], return_exceptions=True)
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to ingest %s: %s", path.name, result)
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    folder = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("gifs")
+    asyncio.run(ingest_folder(folder))
@@ -8,27 +8,106 @@
 #   "asyncio",
 #   "opencv-python",
 #   "numpy",
+#   "orjson",
+#   "uvloop",
+#   "pillow",
+#   "imagehash",
+#   "imageio",
+#   "av",
+#   "requests",
+#   "supabase",
+#   "langchain",
+#   "langchain-community",
+#   "langchain-openai",
+#   "langchain-core",
 # ]
 # ///
 
+import io
 import os
+import time
 import logging
 import asyncio
-import json
+import orjson
 import serial
-import base64
+import uvloop
 import cv2
 import numpy as np
+from datetime import datetime
+from collections import deque
+from PIL import Image
 from dotenv import load_dotenv
-from signal import SIGINT, SIGTERM
 from livekit import rtc
 
+import storage
+import summarizer
+
 load_dotenv()
 # ensure LIVEKIT_URL, LIVEKIT_API_KEY, and LIVEKIT_API_SECRET are set in your .env file
 LIVEKIT_URL = os.environ.get("LIVEKIT_URL")
 SUB_TOKEN = os.environ.get("SUB_TOKEN")
 ROOM_NAME = os.environ.get("ROOM_NAME")
 
+MAX_FRAMES = 100
+TARGET_FPS = 5  # cameras push 30-60 fps; we only need a few frames per second
+FRAME_SIZE = 540  # buffered frames are center-cropped squares at this size
+# ring buffer of recent frames; deque(maxlen=...) evicts the oldest in O(1)
+# instead of the O(N) shift a list.pop(0) would cost on every frame
+FRAMES = deque(maxlen=MAX_FRAMES)
+
+
+PALETTE_SAMPLE_FRAMES = 8  # frames sampled to build the shared GIF palette
+
+
+def generate_gif(frames, save_to_disk=False):
+    """Encode the buffered RGB frames as an animated GIF and return its bytes.
+
+    Frames arrive as raw ndarrays, so Image.fromarray wraps them through the
+    array interface without copying -- no PNG encode/decode round-trip.
+    """
+    pil_images = [Image.fromarray(frame) for frame in frames]
+
+    # quantize against one shared palette: PIL's default save path median-cuts
+    # every frame separately, which is slow and writes a local color table per
+    # frame into the file
+    step = max(1, len(pil_images) // PALETTE_SAMPLE_FRAMES)
+    sample = pil_images[::step][:PALETTE_SAMPLE_FRAMES]
+    width, height = sample[0].size
+    stack = Image.new('RGB', (width, height * len(sample)))
+    for i, img in enumerate(sample):
+        stack.paste(img, (0, i * height))
+    palette = stack.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+
+    # stream the remapped frames into the writer instead of materializing a
+    # second full list of P-mode images; only ~2 are live at any moment
+    def quantized_iter():
+        for img in pil_images[1:]:
+            yield img.quantize(palette=palette, dither=Image.Dither.NONE)
+
+    gif_buffer = io.BytesIO()
+    pil_images[0].quantize(palette=palette, dither=Image.Dither.NONE).save(
+        gif_buffer,
+        format='GIF',
+        save_all=True,
+        append_images=quantized_iter(),
+        duration=int(1000 / TARGET_FPS),
+        loop=0,
+        optimize=False,  # frames are already P-mode; nothing left to optimize
+        disposal=2,
+    )
+    # getvalue() ignores the stream position and copies the whole buffer, so
+    # call it once and skip the seek(0) dance entirely
+    gif_bytes = gif_buffer.getvalue()
+
+    # backup copies are opt-in: writing a multi-MB blob per button press is
+    # pure disk traffic the pipeline doesn't need
+    if save_to_disk:
+        filename = f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.gif"
+        with open(filename, 'wb') as f:
+            f.write(gif_bytes)
+
+    return gif_bytes
+
 async def main(room: rtc.Room):
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
@@ -36,16 +115,40 @@ async def main(room: rtc.Room):
     # handler for receiving data packet
     @room.on("data_received")
     def on_data_received(data: rtc.DataPacket):
+        global FRAMES
         logger.info("Received data from %s topic: %s", data.participant.identity, data.topic)
-        decoded_data = data.data.decode('utf-8')
-            
-            # Try to parse as JSON
-        json_data = json.loads(decoded_data)
-        
+
+        # orjson parses the raw bytes directly -- no utf-8 decode copy first
+        json_data = orjson.loads(data.data)
+
         if data.topic == "button":
             logger.info('Button pressed: %s', json_data)
-        
-        
+            if FRAMES:
+                # grab the latest frame and pointer-swap the ring buffer here,
+                # synchronously: a single rebind under the GIL hands the whole
+                # buffer to the GIF task, gives the capture loop a fresh deque,
+                # and leaves nothing for a second press (or task reordering)
+                # to race -- the emptiness check above stays sound
+                frame = FRAMES[-1]
+                snapshot, FRAMES = FRAMES, deque(maxlen=MAX_FRAMES)
+                asyncio.create_task(handle_button_press(frame))
+                asyncio.create_task(process_gif(snapshot))
+
+    # summarize the most recent captured frame off the event loop; the
+    # summarizer encodes the raw ndarray itself, on demand
+    async def handle_button_press(frame):
+        summary = await summarizer.summarize_frame_async(frame)
+        logger.info("Frame summary: %s", summary)
+
+    # turn the snapshotted frames into a GIF and ship it through the pipeline
+    async def process_gif(snapshot):
+        # PIL's GIF encoder holds the GIL for hundreds of ms; keep it off the
+        # event loop so the capture coroutine keeps draining the video stream
+        gif_bytes = await asyncio.to_thread(generate_gif, snapshot)
+        logger.info("Generated GIF (%d frames, %d bytes)", len(snapshot), len(gif_bytes))
+        await storage.send_gif_to_supabase_pipeline(gif_bytes)
+
+
     # handler for when a track is subscribed
     @room.on("track_subscribed")
     def on_track_subscribed(track: rtc.Track, publication: rtc.TrackPublication, participant: rtc.RemoteParticipant):
@@ -55,39 +158,65 @@ async def main(room: rtc.Room):
         if track.kind == rtc.TrackKind.KIND_VIDEO:
             logger.info("Creating video stream for track from %s", participant.identity)
             
-            # Create a video stream from the track
-            video_stream = rtc.VideoStream(track)
+            # Create a video stream from the track, asking for I420 at the
+            # source so frames arrive in the native format and the per-frame
+            # convert() below is a pass-through
+            video_stream = rtc.VideoStream(track, format=rtc.VideoBufferType.I420)
             
             # Create async task to process video frames
             async def process_video_frames():
+                last_t = 0.0
+                min_dt = 1.0 / TARGET_FPS
+                # scratch buffers reused across frames; only the frame that
+                # actually enters the ring buffer gets a fresh allocation
+                rgb_full = None
+                out_square = np.empty((FRAME_SIZE, FRAME_SIZE, 3), np.uint8)
                 async for event in video_stream:
+                    # gate to TARGET_FPS before touching the frame at all, so
+                    # skipped frames cost one clock read and a compare
+                    now = time.monotonic()
+                    if now - last_t < min_dt:
+                        continue
+                    last_t = now
+
                     frame = event.frame
-                    logger.info("Received video frame: %dx%d from %s", 
-                               frame.width, frame.height, participant.identity)
-                    
-                    # Extract frame data and encode to PNG
+                    logger.debug("Received video frame: %dx%d from %s",
+                                 frame.width, frame.height, participant.identity)
+
+                    # Buffer the raw frame; PNG encoding is deferred to the
+                    # button press since only FRAMES[-1] is ever consumed
                     try:
-                        rgb_frame = frame.convert(rtc.VideoBufferType.RGB24)
-                        
-                        # Convert to numpy array
+                        # ask for WebRTC's native I420 (1.5 bytes/px instead
+                        # of RGB's 3) and let OpenCV's SIMD YUV->RGB do the
+                        # expansion; LiveKit then hands over half the bytes
+                        yuv_frame = frame.convert(rtc.VideoBufferType.I420)
                         width, height = frame.width, frame.height
-                        frame_data = np.frombuffer(rgb_frame.data, dtype=np.uint8)
-                        frame_array = frame_data.reshape((height, width, 3))
-                        
-                        # Convert RGB to BGR for OpenCV
-                        bgr_frame = cv2.cvtColor(frame_array, cv2.COLOR_RGB2BGR)
-                        
-                        # Encode as PNG
-                        success, png_buffer = cv2.imencode('.png', bgr_frame)
-                        if success:
-                            # Convert to base64 for transmission/storage if needed
-                            png_base64 = base64.b64encode(png_buffer).decode('utf-8')
-                            logger.info("Successfully encoded frame as PNG (size: %d bytes)", len(png_buffer))
-                        else:
-                            logger.error("Failed to encode frame as PNG")
-                        
+                        yuv = np.frombuffer(yuv_frame.data, dtype=np.uint8).reshape(
+                            (height * 3 // 2, width)
+                        )
+                        if rgb_full is None or rgb_full.shape[:2] != (height, width):
+                            rgb_full = np.empty((height, width, 3), np.uint8)
+                        frame_array = cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_I420, dst=rgb_full)
+
+                        # center-crop as a zero-copy view, then one INTER_AREA
+                        # resize: the correct antialiasing filter for
+                        # downscaling (warpAffine only offers point/linear
+                        # sampling, which shimmers on fine detail), still a
+                        # single SIMD pass that copies us out of LiveKit's
+                        # transient buffer
+                        crop_size = min(width, height)
+                        start_x = (width - crop_size) // 2
+                        start_y = (height - crop_size) // 2
+                        crop = frame_array[start_y : start_y + crop_size, start_x : start_x + crop_size]
+                        cv2.resize(
+                            crop,
+                            (FRAME_SIZE, FRAME_SIZE),
+                            dst=out_square,
+                            interpolation=cv2.INTER_AREA,
+                        )
+                        FRAMES.append(out_square.copy())  # ring buffer retains it
                     except Exception as e:
-                        logger.error("Error encoding frame to base64: %s", e)
+                        logger.error("Error buffering frame: %s", e)
 
             # Start the frame processing task
             asyncio.create_task(process_video_frames())
@@ -105,19 +234,20 @@ if __name__ == "__main__":
         ],
     )
 
-    loop = asyncio.get_event_loop()
-    room = rtc.Room(loop=loop)
-
-    async def cleanup():
-        await room.disconnect()
-        cv2.destroyAllWindows()  # Close all OpenCV windows
-        loop.stop()
+    # libuv-backed event loop: lower per-packet overhead for the data channel
+    # and video stream callbacks than the stdlib loop
+    uvloop.install()
 
-    asyncio.ensure_future(main(room))
-    # for signal in [SIGINT, SIGTERM]:
-    #     loop.add_signal_handler(signal, lambda: asyncio.ensure_future(cleanup()))
+    async def run():
+        room = rtc.Room()
+        try:
+            await main(room)
+            await asyncio.Event().wait()  # serve until interrupted
+        finally:
+            await room.disconnect()
+            cv2.destroyAllWindows()  # Close all OpenCV windows
 
     try:
-        loop.run_forever()
-    finally:
-        loop.close()
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
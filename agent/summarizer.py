@@ -0,0 +1,76 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# dependencies = [
+#   "python-dotenv",
+#   "opencv-python",
+#   "numpy",
+#   "langchain-openai",
+#   "langchain-core",
+# ]
+# ///
+
+import base64
+import asyncio
+import logging
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+
+from llm import get_llm
+
+load_dotenv()
+# ensure OPENAI_API_KEY is set in your .env file
+logger = logging.getLogger(__name__)
+
+llm = get_llm()
+
+
+JPEG_QUALITY = 85
+
+# the instruction half of the message never changes; build it once
+TEXT_PART = {
+    "type": "text",
+    "text": "Describe this image concisely for a sight-impaired user. "
+    "Lead with the most important object or action.",
+}
+
+
+def _frame_message(frame):
+    """Encode the frame as JPEG and wrap it in a vision HumanMessage."""
+    success, jpeg_buffer = cv2.imencode(
+        ".jpg",
+        np.ascontiguousarray(frame[:, :, ::-1]),  # stored RGB; OpenCV wants BGR
+        [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY],
+    )
+    if not success:
+        raise ValueError("failed to encode frame as JPEG")
+
+    # b64encode reads the encode buffer through the buffer protocol (no
+    # tobytes() copy), and one ASCII decode at the end replaces the
+    # decode-then-f-string pair of large intermediate strings
+    url = (b"data:image/jpeg;base64," + base64.b64encode(jpeg_buffer)).decode("ascii")
+    return HumanMessage(
+        content=[
+            TEXT_PART,
+            {"type": "image_url", "image_url": {"url": url}},
+        ]
+    )
+
+
+def summarize_frame(frame):
+    """Describe a single captured RGB frame with GPT-4o.
+
+    Takes the raw ndarray and encodes JPEG just before the LLM call: JPEG is
+    several times faster to encode than PNG and roughly 10x smaller at
+    comparable perceptual quality, which is all a vision model needs.
+    """
+    return llm.invoke([_frame_message(frame)]).content
+
+
+async def summarize_frame_async(frame):
+    """Async summarize_frame: JPEG encode off-loop, non-blocking LLM call."""
+    message = await asyncio.to_thread(_frame_message, frame)
+    response = await llm.ainvoke([message])
+    return response.content